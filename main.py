@@ -1,71 +1,188 @@
-from fastapi import FastAPI, Path, HTTPException, Query
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, computed_field
-from typing import Annotated, Literal, Optional
+from fastapi import Depends, FastAPI, Path, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-import json
+import aiofiles
+import aiosqlite
+import asyncio
+import msgspec
+from collections import OrderedDict
+import orjson
 import os
 
+from models import Patient, PatientUpdate, bmi_verdict, calculate_bmi
+
 # --- FastAPI App Initialization ---
-app = FastAPI()
-
-# --- Pydantic Models for Data Validation ---
-# data validation using pydantic
-class Patient(BaseModel):
-    id: Annotated[str, Field(..., description='ID of the Patient', example='P001')]
-    name: Annotated[str, Field(..., description='Name of the Patient')]
-    city: Annotated[str, Field(..., description='City where the Patient is living')]
-    age: Annotated[int, Field(..., gt=0, lt=120, description='Age of the Patient')]
-    gender: Annotated[Literal['male', 'female', 'others'], Field(..., description='Gender of the patient')]
-    height: Annotated[float, Field(..., gt=0, description='Height of the Patient in meters')]
-    weight: Annotated[float, Field(..., gt=0, description='Weight of the Patient in kgs')]
-
-    @computed_field
-    @property
-    def bmi(self) -> float:
-        # This check prevents a ZeroDivisionError if height is 0
-        if self.height > 0:
-            bmi = round(self.weight / (self.height**2), 2)
-            return bmi
-        return 0
-
-    @computed_field
-    @property
-    def verdict(self) -> str:
-        # Use the computed bmi property directly
-        if self.bmi < 18.5:
-            return "Underweight"
-        elif self.bmi < 25:
-            return 'Normal'
-        elif self.bmi < 30:
-            return 'Overweight'
-        else:
-            return 'Obesity'
-
-class PatientUpdate(BaseModel):
-    name: Annotated[Optional[str], Field(default=None, description='Name of the Patient')]
-    city: Annotated[Optional[str], Field(default=None, description='City where the Patient is living')]
-    age: Annotated[Optional[int], Field(default=None, gt=0, lt=120, description='Age of the Patient')]
-    gender: Annotated[Optional[Literal['male', 'female', 'others']], Field(default=None, description='Gender of the patient')]
-    height: Annotated[Optional[float], Field(default=None, gt=0, description='Height of the Patient in meters')]
-    weight: Annotated[Optional[float], Field(default=None, gt=0, description='Weight of the Patient in kgs')]
+# orjson is used for every response body
+app = FastAPI(default_response_class=ORJSONResponse)
+# /view and /sort repeat the same keys for every patient, so their JSON compresses very well.
+# Small responses (under 512 bytes) are not worth compressing and are sent as they are.
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
+# --- Request Body Decoding ---
+# FastAPI only knows how to validate Pydantic bodies, so the msgspec models are decoded here from the raw request body.
+def msgspec_body(model):
+    async def decode(request: Request):
+        try:
+            # strict=False accepts the same inputs Pydantic's lax mode did (e.g. 28.0 for an int field)
+            return msgspec.json.decode(await request.body(), type=model, strict=False)
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    return Depends(decode)
+
+def openapi_body(model):
+    # keeps the request body documented in /docs, using the JSON schema msgspec generates for the model
+    _, components = msgspec.json.schema_components([model])
+    schema = components[model.__name__]
+    return {'requestBody': {'required': True, 'content': {'application/json': {'schema': schema}}}}
 
 # --- Helper Functions for Data Handling ---
 
-# let's create a function which will load the data from the json file
-def load_data():
+# The patients live in a SQLite database (WAL mode): a create/edit/delete is a single b-tree update
+# and /sort is one query on an index, instead of rewriting or re-sorting everything.
+DB_FILE = 'patients.db'
+# patients.json is only read once, to fill the database the first time the app starts
+SEED_FILE = 'patients.json'
+
+# the columns we store for a patient, besides the id (the primary key)
+COLUMNS = ('name', 'city', 'age', 'gender', 'height', 'weight', 'bmi', 'verdict')
+SORT_FIELDS = ('height', 'weight', 'bmi')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    city TEXT,
+    age INTEGER,
+    gender TEXT,
+    height REAL,
+    weight REAL,
+    bmi REAL,
+    verdict TEXT
+);
+CREATE INDEX IF NOT EXISTS patients_height ON patients (height, id);
+CREATE INDEX IF NOT EXISTS patients_weight ON patients (weight, id);
+CREATE INDEX IF NOT EXISTS patients_bmi ON patients (bmi, id);
+"""
+
+_SELECT = f"SELECT id, {', '.join(COLUMNS)} FROM patients"
+_INSERT = f"INSERT INTO patients (id, {', '.join(COLUMNS)}) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})"
+# used by /create: an existing id leaves the row alone (rowcount 0) instead of failing the statement
+_INSERT_NEW = f"{_INSERT} ON CONFLICT(id) DO NOTHING"
+_UPDATE = f"UPDATE patients SET {', '.join(f'{column} = ?' for column in COLUMNS)} WHERE id = ?"
+
+# opened in startup(), closed in shutdown()
+# Two connections: every write goes through _DB, every read outside a write through _READ_DB.
+# With WAL the reader always sees the last committed state and never waits for the writer,
+# so nothing that is served or cached can contain a write which isn't committed yet.
+_DB = None
+_READ_DB = None
+# held by create/edit/delete around their statements and the commit, so one request can never commit
+# another request's pending write, and the read-modify-write in /edit can't interleave with anything
+_WRITE_LOCK = None
+
+# Every mutation bumps _VERSION. /sort uses it for its ETag and to know when its cached response bodies are stale.
+# _EPOCH is different on every start, so an ETag from before a restart (when _VERSION starts again at 0) never matches.
+_VERSION = 0
+_EPOCH = os.urandom(4).hex()
+# (sort_by, order) -> (_VERSION the body was built for, serialized body)
+_SORT_RESPONSES: dict = {}
+
+# A small LRU of already serialized /patient/{id} responses, so repeat lookups skip the query and the JSON encoding.
+# Entries are evicted one by one when that patient is edited or deleted.
+_PATIENT_CACHE_SIZE = 128
+_PATIENT_CACHE: OrderedDict = OrderedDict()
+
+def row_to_record(row):
+    # a row is (id, name, city, ...), the record is the dict we return for a patient (without the id)
+    return dict(zip(COLUMNS, row[1:]))
+
+def record_values(record):
+    # the record's values in COLUMNS order; missing sort fields are stored as 0, so they sort like they always did
+    return tuple(record.get(column, 0 if column in SORT_FIELDS else None) for column in COLUMNS)
+
+async def fetch_patient(patient_id, db=None):
+    async with (db or _READ_DB).execute(f'{_SELECT} WHERE id = ?', (patient_id,)) as cursor:
+        row = await cursor.fetchone()
+    return None if row is None else row_to_record(row)
+
+async def cached_patient_json(patient_id):
+    body = _PATIENT_CACHE.get(patient_id)
+    if body is not None:
+        _PATIENT_CACHE.move_to_end(patient_id)
+        return body
+    version = _VERSION
+    record = await fetch_patient(patient_id)
+    if record is None:
+        return None
+    body = orjson.dumps(record)
+    # only cache it if nothing was changed while we were waiting for the query, otherwise it may already be stale
+    if version == _VERSION:
+        _PATIENT_CACHE[patient_id] = body
+    if len(_PATIENT_CACHE) > _PATIENT_CACHE_SIZE:
+        _PATIENT_CACHE.popitem(last=False)
+    return body
+
+def mark_changed(patient_id):
+    # called after every committed create/edit/delete
+    global _VERSION
+    _VERSION += 1
+    _PATIENT_CACHE.pop(patient_id, None)
+
+# number of patients encoded into one chunk of the streamed /view response
+_VIEW_CHUNK_SIZE = 256
+
+async def stream_patients(rows):
+    # yields the same {"id": {...}, ...} object /view always returned, a chunk of patients at a time
+    yield b'{'
+    for start in range(0, len(rows), _VIEW_CHUNK_SIZE):
+        chunk = b','.join(
+            orjson.dumps(row[0]) + b':' + orjson.dumps(row_to_record(row))
+            for row in rows[start:start + _VIEW_CHUNK_SIZE]
+        )
+        yield chunk if start == 0 else b',' + chunk
+    yield b'}'
+
+# the seed file is read through aiofiles so the disk I/O never blocks the event loop
+async def read_json(path):
+    async with aiofiles.open(path, 'rb') as f:
+        return orjson.loads(await f.read())
+
+async def read_seed_data():
     # This try-except block prevents the app from crashing if 'patients.json' doesn't exist or is empty
     try:
-        with open('patients.json', 'r') as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = {}
-    return data
+        return await read_json(SEED_FILE)
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return {}
+
+@app.on_event('startup')
+async def startup():
+    global _DB, _READ_DB, _WRITE_LOCK
+    _WRITE_LOCK = asyncio.Lock()
+    _DB = await aiosqlite.connect(DB_FILE)
+    # WAL lets readers and the writer work at the same time; with WAL, synchronous=NORMAL is still crash-safe
+    await _DB.execute('PRAGMA journal_mode=WAL')
+    await _DB.execute('PRAGMA synchronous=NORMAL')
+    await _DB.executescript(_SCHEMA)
+
+    # first start only: fill the new database from the seed file.
+    # user_version marks a seeded database; it is set in the same transaction as the inserts,
+    # so an empty table (every patient deleted) stays empty after a restart.
+    async with _DB.execute('PRAGMA user_version') as cursor:
+        (seeded,) = await cursor.fetchone()
+    if not seeded:
+        data = await read_seed_data()
+        await _DB.executemany(_INSERT_NEW, [(patient_id, *record_values(record)) for patient_id, record in data.items()])
+        await _DB.execute('PRAGMA user_version = 1')
+        await _DB.commit()
+
+    # the reader is opened after the schema exists; WAL mode is stored in the database file, so it applies here too
+    _READ_DB = await aiosqlite.connect(DB_FILE)
 
-def save_data(data):
-    # Using 'indent=2' makes the JSON file readable for humans
-    with open('patients.json', 'w') as f:
-        json.dump(data, f, indent=2)
+@app.on_event('shutdown')
+async def shutdown():
+    await _READ_DB.close()
+    await _DB.close()
 
 # --- API Endpoints ---
 # NOTE: All API endpoints must be defined BEFORE mounting the static files directory.
@@ -81,104 +198,113 @@ def about():
     return {'message': 'Fully Functional API to Manage your Patient records'}
 
 @app.get('/view')
-def view():
-    return load_data()
+async def view():
+    # fetch the rows first, so edits made while the response is streaming can't change what we are sending
+    async with _READ_DB.execute(f'{_SELECT} ORDER BY rowid') as cursor:
+        rows = await cursor.fetchall()
+    return StreamingResponse(stream_patients(rows), media_type='application/json')
 
 @app.get('/patient/{patient_id}')
-def view_patient(patient_id: str = Path(..., description="ID of the patient in DB", example='P001')):  # our id is string because in patients.json file id is string
+async def view_patient(patient_id: str = Path(..., description="ID of the patient in DB", example='P001')):  # our id is string because in the database the id is string
     # first we will load the patient data
-    data = load_data()
-    if patient_id in data:
-        return data[patient_id]
+    body = await cached_patient_json(patient_id)
+    if body is not None:
+        return Response(content=body, media_type='application/json')
     # return {'ERROR' : 'patient is not found...'}
     # this is not the right way because what we are doing is simply return json content with 200 HTTP state code
     # we need to show 404 code if data not found that's why we'll use HTTPException
     raise HTTPException(status_code=404, detail='Patient not Found')
 
 @app.get('/sort')
-def sort_patient(sort_by: str = Query(..., description='Sort on the basis of height, weight or bmi'), order: str = Query('asc', description='sort in asc or desc order...')):
-    valid_field = ['height', 'weight', 'bmi']
-    if sort_by not in valid_field:
-        raise HTTPException(status_code=400, detail=f'Invalid field, select from {valid_field}')
+async def sort_patient(request: Request, sort_by: str = Query(..., description='Sort on the basis of height, weight or bmi'), order: str = Query('asc', description='sort in asc or desc order...')):
+    if sort_by not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f'Invalid field, select from {list(SORT_FIELDS)}')
     if order not in ['asc', 'desc']:
         raise HTTPException(status_code=400, detail='Invalid order, select between asc and desc')
 
-    data = load_data()
-    # Convert the dictionary of patients into a list for sorting
-    patients_list = list(data.values())
-    sort_order = True if order == 'desc' else False
-    
-    # *** FIX: Use the 'sort_by' variable in the key, not the literal string 'sort_by'. ***
-    sorted_data = sorted(patients_list, key=lambda x: x.get(sort_by, 0), reverse=sort_order)
-    return sorted_data
-
-@app.post('/create')
-def create_patient(patient: Patient):  # patient data will validate from the Patient Pydantic model we don't need to worry about the validation
-    # load exiting data
-    data = load_data()
-    # checking if the patient already exists
-    if patient.id in data:
-        raise HTTPException(status_code=400, detail='Patient already exists')
+    # the result only changes when the data does, so a client that already has this version gets a 304 without a body
+    etag = f'W/"{_EPOCH}-{_VERSION}-{sort_by}-{order}"'
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers={'ETag': etag})
 
+    cached = _SORT_RESPONSES.get((sort_by, order))
+    if cached is not None and cached[0] == _VERSION:
+        body = cached[1]
+    else:
+        version = _VERSION
+        # sort_by and order were checked against fixed lists above, so they are safe to put into the query;
+        # the query walks the (sort_by, id) index, so SQLite doesn't have to sort anything
+        async with _READ_DB.execute(f'{_SELECT} ORDER BY {sort_by} {order}, id {order}') as cursor:
+            rows = await cursor.fetchall()
+        body = orjson.dumps([row_to_record(row) for row in rows])
+        _SORT_RESPONSES[(sort_by, order)] = (version, body)
+    return Response(content=body, media_type='application/json', headers={'ETag': etag})
+
+@app.post('/create', status_code=201, openapi_extra=openapi_body(Patient))
+async def create_patient(patient: Patient = msgspec_body(Patient)):  # patient data will validate from the Patient msgspec model we don't need to worry about the validation
     # new patient add to the database
-    # first we will convert this patient which is a pydantic form into dict
-    # model_dump() is used to convert the Pydantic model to a dictionary.
-    # It correctly includes the computed fields (bmi, verdict).
-    data[patient.id] = patient.model_dump(exclude={'id'})
-    # finally save it
-    save_data(data)
-    return JSONResponse(status_code=201, content={'message': 'patient created successfully'})
-
-@app.put('/edit/{patient_id}')
-def update_patient(patient_id: str, patient_update: PatientUpdate):
-    data = load_data()
-    # first we'll check this patient_id exists in my data base or not
-    if patient_id not in data:
-        raise HTTPException(status_code=404, detail="Patient not found")
-
-    existing_patient_info = data[patient_id]  # this is the existing dictionary which we have
-    # now we have dict and we need to update the data which is given
-    # now we have patient_update data we need to convert it into dictionary
-    update_patient_info = patient_update.model_dump(exclude_unset=True)
-    # we did this: exclude_unset
-    # because if we didn't do that then dictionary will have all the fields that we created
-    # but after this we only have those which user want to update
-
-    # This loop updates the existing patient's data with the new data provided.
-    for key, value in update_patient_info.items():
-        existing_patient_info[key] = value
-
-    # data[patient_id] = existing_patient_info
-    # we can't do directly this because if we change weight then other two parameters also change, that's why we need a mechanism which also update those
-    # existing_patient_info --> pydantic object --> updated bmi + verdict --> pydantic object -> dict
-
-    # but this will give error
-    # because in existing_patient_info dict we don't have id parameters that's why we need to add this id parameter first
-    existing_patient_info['id'] = patient_id
-    
-    # By creating a new Patient object, Pydantic re-runs the validation and recalculates the computed fields (bmi, verdict).
-    patient_pydantic_obj = Patient(**existing_patient_info)
-    
-    # now we don't need the id when we get dict we get id but that we don't want
-    # Convert the fully updated Pydantic object back to a dictionary to be stored in our JSON file.
-    existing_patient_info = patient_pydantic_obj.model_dump(exclude={'id'})
-    
-    # add this dict to data
-    data[patient_id] = existing_patient_info
-    # save
-    save_data(data)
-    return JSONResponse(status_code=200, content={'message': 'patient updated successfully'})
+    # first we will convert this patient which is a msgspec object into dict
+    # to_record() includes the computed fields (bmi, verdict) and leaves out the id.
+    async with _WRITE_LOCK:
+        async with _DB.execute(_INSERT_NEW, (patient.id, *record_values(patient.to_record()))) as cursor:
+            inserted = cursor.rowcount
+        await _DB.commit()
+        # the id is the primary key, so nothing is inserted if the patient already exists
+        if not inserted:
+            raise HTTPException(status_code=400, detail='Patient already exists')
+        mark_changed(patient.id)
+    return {'message': 'patient created successfully'}
+
+@app.put('/edit/{patient_id}', openapi_extra=openapi_body(PatientUpdate))
+async def update_patient(patient_id: str, patient_update: PatientUpdate = msgspec_body(PatientUpdate)):
+    async with _WRITE_LOCK:
+        # read through the writer, inside the lock, so the record can't change before our UPDATE
+        stored_patient_info = await fetch_patient(patient_id, _DB)
+        # first we'll check this patient_id exists in my data base or not
+        if stored_patient_info is None:
+            raise HTTPException(status_code=404, detail="Patient not found")
+
+        # now we have patient_update data we need to convert it into dictionary
+        # changes() leaves out the fields which were not sent (or sent as null)
+        # because if we didn't do that then dictionary will have all the fields that we created
+        # but after this we only have those which user want to update
+        # (the edit form always sends every field, so we also drop the ones which still have the same value)
+        update_patient_info = {key: value for key, value in patient_update.changes().items() if stored_patient_info.get(key) != value}
+
+        # nothing really changed: no need to touch the database or the caches
+        if not update_patient_info:
+            return {'message': 'patient updated successfully'}
+
+        # The updated fields were already validated by PatientUpdate and the rest were validated when the patient was created,
+        # so instead of rebuilding a whole Patient object we merge into the stored record
+        existing_patient_info = {**stored_patient_info, **update_patient_info}
+
+        # if we change height or weight then bmi and verdict also change, so those are recomputed here
+        if 'height' in update_patient_info or 'weight' in update_patient_info:
+            bmi = calculate_bmi(existing_patient_info['height'], existing_patient_info['weight'])
+            existing_patient_info['bmi'] = bmi
+            existing_patient_info['verdict'] = bmi_verdict(bmi)
+
+        # save
+        async with _DB.execute(_UPDATE, (*record_values(existing_patient_info), patient_id)) as cursor:
+            updated = cursor.rowcount
+        await _DB.commit()
+        if not updated:
+            raise HTTPException(status_code=404, detail="Patient not found")
+        mark_changed(patient_id)
+    return {'message': 'patient updated successfully'}
 
 @app.delete('/delete/{patient_id}')  # here we will get a patient_id
-def delete_patient(patient_id: str):
-    # load data
-    data = load_data()
-    if patient_id not in data:
-        raise HTTPException(status_code=404, detail='patient data is not found')
-    
-    del data[patient_id]
-    save_data(data)
-    return JSONResponse(status_code=200, content={'message': 'patient deleted successfully'})
+async def delete_patient(patient_id: str):
+    async with _WRITE_LOCK:
+        async with _DB.execute('DELETE FROM patients WHERE id = ?', (patient_id,)) as cursor:
+            deleted = cursor.rowcount
+        await _DB.commit()
+        if not deleted:
+            raise HTTPException(status_code=404, detail='patient data is not found')
+        mark_changed(patient_id)
+    return {'message': 'patient deleted successfully'}
 
 
 # --- Static Files Mount (MUST BE LAST) ---
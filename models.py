@@ -0,0 +1,73 @@
+# Request body models used by main.py.
+# They live in their own module so they can optionally be compiled with Cython (see setup.py);
+# main.py imports the compiled extension automatically when it has been built.
+import bisect
+import msgspec
+from functools import cached_property
+from typing import Annotated, Literal, Optional
+
+# --- BMI Helpers ---
+# Shared by the Patient model and by the /edit endpoint, which recomputes bmi without rebuilding a Patient
+def calculate_bmi(height, weight):
+    # This check prevents a ZeroDivisionError if height is 0
+    if height > 0:
+        return round(weight / (height**2), 2)
+    return 0
+
+# verdict boundaries: below 18.5 Underweight, below 25 Normal, below 30 Overweight, anything else Obesity
+_BMI_THRESHOLDS = (18.5, 25.0, 30.0)
+_BMI_LABELS = ('Underweight', 'Normal', 'Overweight', 'Obesity')
+
+def bmi_verdict(bmi):
+    # bisect_right so a bmi exactly on a boundary (e.g. 25.0) falls into the upper category, like the old `<` checks
+    return _BMI_LABELS[bisect.bisect_right(_BMI_THRESHOLDS, bmi)]
+
+# --- msgspec Models for Data Validation ---
+# data validation using msgspec: the request body is decoded and validated in one pass in C
+# (main.py decodes the raw body with msgspec_body(), see there)
+# Structs are slot-based already; the models are also frozen (request bodies are never mutated)
+# and reject unknown fields, the msgspec equivalent of ConfigDict(frozen=True, extra='forbid').
+# dict=True gives Patient a (lazily created) __dict__ so bmi and verdict can be cached with cached_property
+class Patient(msgspec.Struct, dict=True, frozen=True, forbid_unknown_fields=True):
+    id: Annotated[str, msgspec.Meta(description='ID of the Patient', examples=['P001'])]
+    name: Annotated[str, msgspec.Meta(description='Name of the Patient')]
+    city: Annotated[str, msgspec.Meta(description='City where the Patient is living')]
+    age: Annotated[int, msgspec.Meta(gt=0, lt=120, description='Age of the Patient')]
+    gender: Annotated[Literal['male', 'female', 'others'], msgspec.Meta(description='Gender of the patient')]
+    height: Annotated[float, msgspec.Meta(gt=0, description='Height of the Patient in meters')]
+    weight: Annotated[float, msgspec.Meta(gt=0, description='Weight of the Patient in kgs')]
+
+    # cached_property: bmi is computed once per instance, even though verdict and to_record() both read it
+    @cached_property
+    def bmi(self) -> float:
+        return calculate_bmi(self.height, self.weight)
+
+    @cached_property
+    def verdict(self) -> str:
+        # Use the computed bmi property directly
+        return bmi_verdict(self.bmi)
+
+    def to_record(self) -> dict:
+        # the dict we store for a patient: every field except the id (it is the key), plus bmi and verdict
+        return {
+            'name': self.name,
+            'city': self.city,
+            'age': self.age,
+            'gender': self.gender,
+            'height': self.height,
+            'weight': self.weight,
+            'bmi': self.bmi,
+            'verdict': self.verdict,
+        }
+
+class PatientUpdate(msgspec.Struct, frozen=True, forbid_unknown_fields=True):
+    name: Optional[Annotated[str, msgspec.Meta(description='Name of the Patient')]] = None
+    city: Optional[Annotated[str, msgspec.Meta(description='City where the Patient is living')]] = None
+    age: Optional[Annotated[int, msgspec.Meta(gt=0, lt=120, description='Age of the Patient')]] = None
+    gender: Optional[Annotated[Literal['male', 'female', 'others'], msgspec.Meta(description='Gender of the patient')]] = None
+    height: Optional[Annotated[float, msgspec.Meta(gt=0, description='Height of the Patient in meters')]] = None
+    weight: Optional[Annotated[float, msgspec.Meta(gt=0, description='Weight of the Patient in kgs')]] = None
+
+    def changes(self) -> dict:
+        # only the fields the user actually sent, a missing field or a null means "leave it as it is"
+        return {key: value for key, value in msgspec.structs.asdict(self).items() if value is not None}
@@ -0,0 +1,16 @@
+# Optional build step: compiles models.py into a C extension with Cython.
+#   pip install cython
+#   python setup.py build_ext --inplace
+# The resulting models.*.so / models.*.pyd is picked up by `from models import ...` in main.py.
+# Without it the plain models.py is used, so the app runs the same either way.
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+setup(
+    name='patient-management-models',
+    ext_modules=cythonize(
+        [Extension('models', ['models.py'])],
+        # binding=True compiles the methods as regular Python functions, so cached_property and introspection keep working
+        compiler_directives={'language_level': 3, 'binding': True},
+    ),
+)